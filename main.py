@@ -2,18 +2,28 @@ import logging
 import json
 import os
 import base64
+import asyncio
+import time
+import uuid
 import chainlit as cl
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 from utils.csv_utils import prepare_file_for_api
 from utils.image_utils import encode_image
+from utils.table_utils import load_table, digest_table, ui_rows_label, MAX_UI_ROWS
 from utils.history_utils import truncate_history
 from utils.tavily_utils import tavily_search
 from utils.cleanup_utils import cleanup_on_exit, cleanup_session
-from utils.tool_executor import execute_tool, handle_code_retry
+from utils.tool_executor import (
+    execute_tool, handle_code_retry, start_speculative_run, discard_unconfirmed_runs, discard_speculative_runs,
+)
 from utils.chat_start import start
-from utils.logger_config import logger
+from utils.logger_config import logger, bind_session, bind_turn
+from utils.response_cache import response_cache
+from utils.stream_coalescer import TokenCoalescer
+from utils.model_router import model_router
+from utils.turn_scheduler import TurnScheduler
 
 
 from tools.types import ToolResult, ToolResultType
@@ -27,41 +37,140 @@ client = AsyncOpenAI(
 cl.instrument_openai()
 
 
-#function to stream text response
-async def stream_text_response(input_payload, tools):
+#replay a cached response through the same streaming UI path
+async def replay_cached_response(cached, chunk_size=40, chunk_delay=0.01):
     msg = cl.Message(content="")
     await msg.send()
+    coalescer = TokenCoalescer(msg)
+    text = cached.output_text
+    try:
+        for i in range(0, len(text), chunk_size):
+            await coalescer.push(text[i:i + chunk_size])
+            await asyncio.sleep(chunk_delay)  # pace chunks so the coalescer flushes them as a stream
+    except BaseException:
+        coalescer.abort()
+        raise
+    await coalescer.close()
+    await msg.update()
+    return cached
+
+
+#stream one response from a given model into the given chainlit message
+async def stream_from_model(msg, model, input_payload, tools, speculate=False):
+    await msg.send()
+    coalescer = TokenCoalescer(msg)  # batches deltas into fewer websocket frames
+    call_names = {}  # output item id -> function name
+
+    try:
+        async with client.responses.stream(
+            model=model,
+            input=input_payload,
+            tools=tools,
+            store=True,
+        ) as stream:
+            async for event in stream:
+                if event.type == "response.output_text.delta":
+                    await coalescer.push(event.delta)
+                elif event.type == "response.error":
+                    await coalescer.push(f"\n❌ Error: {event.error}")
+                elif speculate and event.type == "response.output_item.added" and event.item.type == "function_call":
+                    call_names[event.item.id] = event.item.name
+                elif speculate and event.type == "response.function_call_arguments.done":
+                    # Arguments are final before the response is; start the tool early
+                    name = getattr(event, "name", None) or call_names.get(event.item_id)
+                    start_speculative_run(name, event.arguments)
+            final_response = await stream.get_final_response()
+    except BaseException:
+        coalescer.abort()
+        if speculate:
+            discard_unconfirmed_runs([])  # no final response, nothing will claim them
+        raise
+
+    if speculate:
+        discard_unconfirmed_runs(final_response.output)
+
+    await coalescer.close()
+    await msg.update()
+    return final_response
+
 
-    async with client.responses.stream(
-        model=cl.user_session.get("settings")["model"],
-        input=input_payload,
-        tools=tools,
-        store=True,
-    ) as stream:
-        async for event in stream:
-            if event.type == "response.output_text.delta":
-                await msg.stream_token(event.delta)
-            elif event.type == "response.error":
-                await msg.stream_token(f"\n❌ Error: {event.error}")
-            elif event.type == "response.completed":
-                await msg.update()
-        final_response = await stream.get_final_response()
-        return final_response
+#function to stream text response
+async def stream_text_response(input_payload, tools, route="primary"):
+    settings = cl.user_session.get("settings")
+    cache_key = None
+    if settings.get("cache_responses"):
+        cache_key = await response_cache.key_for(settings["model"], settings.get("temperature"), tools, input_payload)
+        cached = response_cache.lookup(cache_key) if cache_key else None
+        if cached:
+            return await replay_cached_response(cached)
+
+    # Repair/follow-up calls may start on a faster tier and escalate on failure
+    ladder = model_router.ladder(route, settings["model"])
+    for attempt in range(len(ladder)):
+        model = model_router.pick(route, settings["model"], ladder, attempt)
+        msg = cl.Message(content="")
+        started = time.monotonic()
+        is_last = attempt == len(ladder) - 1
+        try:
+            final_response = await stream_from_model(msg, model, input_payload, tools, speculate=(route == "primary"))
+        except Exception:
+            model_router.record(route, model, time.monotonic() - started, success=False)
+            if is_last:
+                raise
+            await msg.remove()  # drop the partial bubble before escalating
+            continue
+
+        success = bool(final_response.output_text) or any(
+            item.type in ["tool_call", "function_call"] for item in final_response.output or []
+        )
+        model_router.record(route, model, time.monotonic() - started, success)
+        if success or is_last:
+            break
+        await msg.remove()  # empty answer from a fast tier, escalate without leaving a blank bubble
+
+    # The key names the chosen model; don't replay a fast-tier answer under it
+    if cache_key and model == settings["model"]:
+        response_cache.store(cache_key, final_response)
+    return final_response
     
 # ----------------- On Message -----------------
 @cl.on_message
 async def on_message(message: cl.Message):
+    # Serialize turns per session; a new message cancels the in-flight turn
+    scheduler = cl.user_session.get("turn_scheduler")
+    if scheduler is None:
+        scheduler = TurnScheduler()
+        cl.user_session.set("turn_scheduler", scheduler)
+    await scheduler.submit(lambda: run_turn(message), on_dropped=lambda: keep_dropped_message(message))
+
+
+def keep_dropped_message(message: cl.Message):
+    """A turn superseded before it started still leaves the user's question in history."""
+    text = message.content
+    names = [el.name for el in message.elements or []]
+    if names:
+        text += f"\n[Attached but not processed: {', '.join(names)}]"
     history = cl.user_session.get("message_history", [])
+    cl.user_session.set("message_history", history + [
+        {"role": "user", "content": [{"type": "input_text", "text": text}]}
+    ])
+
+
+async def run_turn(message: cl.Message):
+    bind_session(cl.user_session.get("id"))
+    bind_turn(uuid.uuid4().hex[:8])  # correlates every log line of this turn
+    # Work on a copy so a cancelled turn never leaves half-written history behind
+    history = list(cl.user_session.get("message_history", []))
 
     if len(history) > 10:
         history = truncate_history(history)
+    committed = list(history)
 
     # --- File Handling ---
     file_blocks = []
     if message.elements:
         for el in message.elements:
-            print("message elements",el)
-            print("message type",el.type)
+            logger.info(f"Received upload {el.name} (type={el.type})")
 
             prepared,error = prepare_file_for_api(el)
             file_blocks.extend(prepared)
@@ -118,6 +227,19 @@ async def on_message(message: cl.Message):
                                     content=result.desc,
                                     elements=[cl.Image(path=result.content, caption=result.desc)],
                                 ).send()
+                            elif result.type == ToolResultType.table:
+                                try:
+                                    df = await asyncio.to_thread(load_table, result.content)
+                                    digest = digest_table(df, result.desc)
+                                except Exception as e:
+                                    logger.error(f"Could not read emitted table '{result.desc}': {e}")
+                                    tool_content.append(f"Error: could not read emitted table '{result.desc}': {e}")
+                                    continue
+                                tool_content.append(digest)
+                                await cl.Message(
+                                    content=f"📊 {result.desc} ({df.shape[0]} rows × {df.shape[1]} columns; showing {ui_rows_label(df.shape[0])})",
+                                    elements=[cl.Dataframe(data=df.head(MAX_UI_ROWS), name=result.desc, display="inline")],
+                                ).send()
                             
 
                         tool_message = {
@@ -128,7 +250,7 @@ async def on_message(message: cl.Message):
 
                         history.append(tool_message)
                         
-                        follow_up = await stream_text_response(history, tools)
+                        follow_up = await stream_text_response(history, tools, route="followup")
 
                         history.append({
                             "role": "assistant",
@@ -142,9 +264,17 @@ async def on_message(message: cl.Message):
 
         # Save history back
         cl.user_session.set("message_history", history)
+    except asyncio.CancelledError:
+        # Superseded: keep what the user asked, drop the partial answer
+        cl.user_session.set("message_history", committed + [user_message])
+        raise
     except Exception as e:
+        # Keep the user's message even though the turn failed
+        cl.user_session.set("message_history", committed + [user_message])
         logger.error(f"Error processing message: {str(e)}")
         await cl.Message(content=f"❌ Error: {str(e)}").send()
+    finally:
+        discard_speculative_runs()
 
 
 # ----------------- Entrypoint -----------------
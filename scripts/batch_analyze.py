@@ -0,0 +1,231 @@
+"""
+Headless batch analysis of pathway result tables.
+
+Runs each matching file (by default the `ora_*.csv` tables written by the
+pathway.py pipeline) through the same on_message/execute_tool pipeline as
+the chat UI, without a browser, and writes the interpretation, figures and
+emitted tables to an output directory. Progress is checkpointed so an
+interrupted run can be resumed.
+
+    python -m scripts.batch_analyze results/ --out batch_out --concurrency 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import shutil
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from pydantic import BaseModel
+
+import main
+import tools.local_code_runner as local_code_runner
+from utils.headless import BASE_DIR, open_headless_session, stage_upload, user_message, close_headless_session
+from utils.logger_config import logger
+
+
+class BatchPrompt(BaseModel):
+    text: str
+    figure: bool = False  # the turn must produce a figure to count as done
+
+
+STANDARD_PROMPTS = [
+    BatchPrompt(text="Interpret this pathway enrichment table: list the top significant pathways by FDR, "
+                     "their direction of regulation, and any patterns across clusters or regions."),
+    BatchPrompt(text="Generate a dot plot of the top 20 pathways by FDR, with enrichment ratio on the x-axis, "
+                     "point size for hits and color for -log10(FDR). Save it as a PNG.", figure=True),
+    BatchPrompt(text="Generate a bar chart of the top 15 pathways by -log10(FDR), colored by regulation direction. "
+                     "Save it as a PNG.", figure=True),
+]
+
+
+# ----------------- Concurrency Limits -----------------
+class BoundedResponses:
+    """Wraps client.responses so at most N LLM calls run at once across all files."""
+
+    def __init__(self, responses, limit: int):
+        self._responses = responses
+        self._slots = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def stream(self, **kwargs):
+        async with self._slots:
+            async with self._responses.stream(**kwargs) as stream:
+                yield stream
+
+    async def create(self, **kwargs):
+        async with self._slots:
+            return await self._responses.create(**kwargs)
+
+
+class BoundedClient:
+    def __init__(self, client, limit: int):
+        self._client = client
+        self.responses = BoundedResponses(client.responses, limit)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# ----------------- Checkpointing -----------------
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """JSON record of finished files, rewritten atomically after each one."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = json.loads(path.read_text()) if path.exists() else {"files": {}}
+        self._lock = asyncio.Lock()
+
+    def is_done(self, name: str, digest: str) -> bool:
+        entry = self.data["files"].get(name)
+        return bool(entry) and entry["status"] == "done" and entry["sha256"] == digest
+
+    async def record(self, name: str, **entry):
+        async with self._lock:
+            self.data["files"][name] = entry
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.data, indent=2))
+            tmp.replace(self.path)
+
+
+# ----------------- Batch Runner -----------------
+def collect_outputs(session_id: str, out_dir: Path, tool_outputs: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Copy figures and emitted tables from the session's sandbox runs.
+    Only files returned by a successful tool call count; failed attempts and
+    discarded speculative runs leave files behind too.
+    """
+    run_dir = BASE_DIR / "runs" / session_id
+    figures, tables = [], []
+    if not run_dir.exists():
+        return figures, tables
+
+    def returned(path: Path) -> bool:
+        rel = str(path.relative_to(run_dir))
+        return any(rel in out for out in tool_outputs)
+
+    for png in sorted(run_dir.glob("code_run_*/*.png")):
+        if not returned(png):
+            continue
+        dest = out_dir / "figures" / f"{png.parent.name}_{png.name}"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(png, dest)
+        figures.append(str(dest.relative_to(out_dir)))
+    for table in sorted(run_dir.glob("code_run_*/emitted/*")):
+        if table.name == "values.json" or not returned(table):
+            continue
+        dest = out_dir / "tables" / f"{table.parent.parent.name}_{table.name}"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(table, dest)
+        tables.append(str(dest.relative_to(out_dir)))
+    return figures, tables
+
+
+def write_report(path: Path, source: Path, prompts, messages, figures, tables):
+    lines = [f"# {source.name}", ""]
+    lines += ["## Prompts", *[f"{i}. {p.text}" for i, p in enumerate(prompts, 1)], ""]
+    lines += ["## Assistant output", ""]
+    for msg in messages:
+        lines += [msg, ""]
+    if figures:
+        lines += ["## Figures", *[f"![{Path(f).name}]({f})" for f in figures], ""]
+    if tables:
+        lines += ["## Tables", *[f"- [{Path(t).name}]({t})" for t in tables], ""]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def failure_reasons(failures: dict[str, int], prompts, figures) -> list[str]:
+    """Why a file's analysis is incomplete, from what the UI would have shown."""
+    reasons = []
+    if failures["turn_errors"]:
+        reasons.append(f"{failures['turn_errors']} turn(s) ended with an error")
+    if failures["unrecovered_code_errors"]:
+        reasons.append(f"{failures['unrecovered_code_errors']} code run(s) still failing after retries")
+    expected_figures = sum(p.figure for p in prompts)
+    if len(figures) < expected_figures:
+        reasons.append(f"{len(figures)} of {expected_figures} requested figures produced")
+    return reasons
+
+
+async def process_file(source: Path, args, checkpoint: Checkpoint, file_slots: asyncio.Semaphore):
+    digest = file_digest(source)
+    if args.resume and checkpoint.is_done(source.name, digest):
+        logger.info(f"[BATCH] skip {source.name} (already done)")
+        return
+
+    async with file_slots:
+        started = time.monotonic()
+        out_dir = args.out / source.stem
+        out_dir.mkdir(parents=True, exist_ok=True)
+        session_id, emitter = await open_headless_session()
+        try:
+            for i, prompt in enumerate(args.prompts):
+                elements = [stage_upload(source, session_id)] if i == 0 else []
+                await main.on_message(user_message(prompt.text, elements))
+
+            messages = emitter.assistant_messages()
+            figures, tables = collect_outputs(session_id, out_dir, emitter.successful_tool_outputs())
+            write_report(out_dir / "report.md", source, args.prompts, messages, figures, tables)
+
+            reasons = failure_reasons(emitter.failures(), args.prompts, figures)
+            status = "failed" if reasons else "done"
+            await checkpoint.record(
+                source.name, sha256=digest, status=status, error="; ".join(reasons) or None,
+                figures=len(figures), tables=len(tables), seconds=round(time.monotonic() - started, 1),
+            )
+            logger.info(f"[BATCH] {source.name}: {status} ({len(figures)} figures, {len(tables)} tables)"
+                        + (f" - {'; '.join(reasons)}" if reasons else ""))
+        except Exception as e:
+            logger.error(f"[BATCH] {source.name} failed: {e}")
+            await checkpoint.record(source.name, sha256=digest, status="failed", error=str(e))
+        finally:
+            close_headless_session(session_id)
+
+
+async def run(args):
+    main.client = BoundedClient(main.client, args.llm_concurrency)
+    local_code_runner._sandbox_slots = asyncio.Semaphore(args.sandbox_concurrency)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(args.out / "checkpoint.json")
+    sources = sorted(p for p in args.input_dir.glob(args.pattern) if p.is_file())
+    logger.info(f"[BATCH] {len(sources)} files matching {args.pattern} in {args.input_dir}")
+
+    file_slots = asyncio.Semaphore(args.concurrency)
+    await asyncio.gather(*(process_file(src, args, checkpoint, file_slots) for src in sources))
+
+    statuses = [entry["status"] for entry in checkpoint.data["files"].values()]
+    logger.info(f"[BATCH] finished: {statuses.count('done')} done, {statuses.count('failed')} failed")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the analysis assistant over a directory of result tables.")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("--out", type=Path, default=Path("batch_out"))
+    parser.add_argument("--pattern", default="ora_*.csv")
+    parser.add_argument("--concurrency", type=int, default=4, help="files processed at once")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM calls in flight across all files")
+    parser.add_argument("--sandbox-concurrency", type=int, default=local_code_runner.SANDBOX_MAX_CONCURRENT)
+    parser.add_argument("--prompt", dest="prompts", action="append", type=lambda s: BatchPrompt(text=s),
+                        help="replace the standard prompts (repeatable, one turn each)")
+    parser.add_argument("--figure-prompt", dest="prompts", action="append",
+                        type=lambda s: BatchPrompt(text=s, figure=True),
+                        help="like --prompt, but the turn must produce a figure")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="reprocess files already marked done in the checkpoint")
+    args = parser.parse_args()
+    args.prompts = args.prompts or STANDARD_PROMPTS
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
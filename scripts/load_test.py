@@ -0,0 +1,251 @@
+"""
+Concurrent-session load generator.
+
+Drives N simulated chat sessions through main.on_message with the LLM and
+Tavily backends replaced by local stubs, and reports turn latency, time to
+first token, event-loop lag, sandbox queueing and memory per concurrency level.
+
+    python -m scripts.load_test --levels 1,8,32,64 --turns 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("API_KEY", "load-test")  # main builds an AsyncOpenAI client at import
+
+import main
+import utils.tool_executor as tool_executor
+from tools.local_code_runner import sandbox_stats
+from utils.headless import open_headless_session, stage_upload, user_message, close_headless_session
+from utils.stream_coalescer import stream_stats
+
+STUB_CODE = (
+    "import pandas as pd\n"
+    "df = pd.read_csv({path!r})\n"
+    "print(df.sort_values('FDR').head(10).to_string())\n"
+)
+
+
+# ----------------- Stub Backends -----------------
+class StubStream:
+    """Mimics AsyncOpenAI's responses.stream(): async context manager yielding events."""
+
+    def __init__(self, backend, response, text):
+        self.backend = backend
+        self.response = response
+        self.text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        cfg = self.backend.cfg
+        await asyncio.sleep(cfg.first_token_ms / 1000)
+        for i in range(0, len(self.text), cfg.token_chars):
+            yield SimpleNamespace(type="response.output_text.delta", delta=self.text[i:i + cfg.token_chars])
+            await asyncio.sleep(cfg.token_interval_ms / 1000)
+        for item in self.response.output:
+            if item.type == "function_call":
+                yield SimpleNamespace(type="response.function_call_arguments.done", item_id=item.id,
+                                      name=item.name, arguments=item.arguments)
+        yield SimpleNamespace(type="response.completed", response=self.response)
+
+    async def get_final_response(self):
+        return self.response
+
+
+class StubResponses:
+    """OpenAI-compatible stand-in for client.responses with configurable timing."""
+
+    def __init__(self, cfg, rng):
+        self.cfg = cfg
+        self.rng = rng
+
+    def _build(self, input):
+        # Fresh user turn -> maybe call a tool; after tool output -> plain text
+        last = input[-1] if input else {}
+        text = " ".join(self.rng.choice(["pathway", "enrichment", "FDR", "up-regulated", "lipid", "cluster"])
+                        for _ in range(self.cfg.tokens_per_response))
+        output = [SimpleNamespace(type="message")]
+        if last.get("role") == "user" and self.rng.random() < self.cfg.tool_ratio:
+            if self.rng.random() < self.cfg.search_share:
+                name, args = "tavily_search", {"query": "glycolysis pathway"}
+            else:
+                paths = [line[6:] for part in last["content"] for line in part.get("text", "").splitlines()
+                         if line.startswith("Path: ")]
+                name, args = "local_code_run", {"code": STUB_CODE.format(path=paths[0] if paths else "missing.csv")}
+            output.append(SimpleNamespace(type="function_call", name=name, arguments=json.dumps(args),
+                                          id=f"fc_{uuid.uuid4().hex[:12]}", call_id=f"call_{uuid.uuid4().hex[:12]}"))
+        usage = SimpleNamespace(input_tokens=len(json.dumps(input)) // 4, output_tokens=len(text) // 4)
+        return SimpleNamespace(output=output, output_text=text, usage=usage, status="completed", error=None), text
+
+    def stream(self, model, input, tools=None, **kwargs):
+        response, text = self._build(input)
+        return StubStream(self, response, text)
+
+    async def create(self, model, input, tools=None, **kwargs):
+        response, text = self._build(input)
+        await asyncio.sleep((self.cfg.first_token_ms + self.cfg.token_interval_ms * len(text) / self.cfg.token_chars) / 1000)
+        return response
+
+
+async def stub_tavily_search(query: str, num_results: int = 5, latency_ms: int = 300):
+    await asyncio.sleep(latency_ms / 1000)
+    return {
+        "results": [{"title": f"Result {i} for {query}", "url": f"https://example.org/{i}"} for i in range(num_results)],
+        "images": [],
+    }
+
+
+# ----------------- Measurement -----------------
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.01):
+    while True:
+        t0 = time.monotonic()
+        await asyncio.sleep(interval)
+        samples.append(time.monotonic() - t0 - interval)
+
+
+def write_sample_csv(path: Path, rows: int = 200):
+    rng = random.Random(0)
+    lines = ["pathway,Raw.p,FDR,hits,expected,cluster,region,omics,regulated,pathway_avg_log2FC"]
+    for i in range(rows):
+        p = rng.random() * 0.1
+        lines.append(f"Pathway_{i},{p:.5f},{min(1, p * 5):.5f},{rng.randint(1, 20)},{rng.random() * 5:.3f},"
+                     f"{rng.randint(1, 6)},R{rng.randint(1, 4)},lipidomics,{rng.choice(['up', 'down', 'neutral'])},"
+                     f"{rng.gauss(0, 1):.3f}")
+    path.write_text("\n".join(lines))
+
+
+async def simulate_session(args, sample_csv: Path, turn_stats: list) -> dict[str, int]:
+    session_id, emitter = await open_headless_session()
+    try:
+        for turn in range(args.turns):
+            elements = [stage_upload(sample_csv, session_id)] if turn == 0 else []
+            emitter.reset_turn()
+            started = time.monotonic()
+            await main.on_message(user_message("Which pathways are most significant?", elements))
+            ended = time.monotonic()
+            ttft = (emitter.first_frame_at - started) if emitter.first_frame_at else None
+            turn_stats.append({"latency": ended - started, "ttft": ttft})
+            await asyncio.sleep(args.think_ms / 1000)
+        return emitter.failures()
+    finally:
+        close_headless_session(session_id)
+
+
+async def run_level(args, concurrency: int, sample_csv: Path) -> dict:
+    turn_stats, lag = [], []
+    sandbox_stats["queue_waits"].clear()
+    sandbox_stats["queue_wait_max"] = 0.0
+    frames_before = stream_stats["frames"]
+
+    monitor = asyncio.create_task(monitor_loop_lag(lag))
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(simulate_session(args, sample_csv, turn_stats) for _ in range(concurrency)),
+        return_exceptions=True,
+    )
+    elapsed = time.monotonic() - started
+    monitor.cancel()
+
+    latencies = [t["latency"] for t in turn_stats]
+    ttfts = [t["ttft"] for t in turn_stats if t["ttft"] is not None]
+    waits = list(sandbox_stats["queue_waits"])
+    return {
+        "concurrency": concurrency,
+        "turns": len(turn_stats),
+        "crashed_sessions": sum(isinstance(r, BaseException) for r in results),
+        "turn_errors": sum(r["turn_errors"] for r in results if isinstance(r, dict)),
+        "tool_errors": sum(r["tool_errors"] for r in results if isinstance(r, dict)),
+        "turn_p50_s": percentile(latencies, 50),
+        "turn_p99_s": percentile(latencies, 99),
+        "ttft_p50_s": percentile(ttfts, 50),
+        "ttft_p99_s": percentile(ttfts, 99),
+        "loop_lag_p99_ms": percentile(lag, 99) * 1000,
+        "loop_lag_max_ms": max(lag, default=0.0) * 1000,
+        "sandbox_runs": len(waits),
+        "sandbox_wait_mean_s": statistics.fmean(waits) if waits else 0.0,
+        "sandbox_wait_max_s": sandbox_stats["queue_wait_max"],
+        "frames_per_s": (stream_stats["frames"] - frames_before) / elapsed,
+        "rss_mb": rss_mb(),
+    }
+
+
+def print_report(rows):
+    cols = ["concurrency", "turns", "crashed_sessions", "turn_errors", "tool_errors", "turn_p50_s", "turn_p99_s", "ttft_p50_s", "ttft_p99_s",
+            "loop_lag_p99_ms", "sandbox_runs", "sandbox_wait_max_s", "frames_per_s", "rss_mb"]
+    print(" | ".join(cols))
+    for row in rows:
+        print(" | ".join(f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]) for c in cols))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    main.client = SimpleNamespace(responses=StubResponses(args, rng))
+    tool_executor.tavily_search = lambda query, num_results=5: stub_tavily_search(query, num_results, args.search_ms)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sample_csv = Path(tmp) / "ora_region1_lipidomics.csv"
+        write_sample_csv(sample_csv)
+        for level in args.levels:
+            row = await run_level(args, level, sample_csv)
+            rows.append(row)
+            print_report([row])
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test on_message with stubbed LLM and search backends.")
+    parser.add_argument("--levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16, 32])
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--think-ms", type=int, default=200, help="pause between turns")
+    parser.add_argument("--first-token-ms", type=int, default=400)
+    parser.add_argument("--token-interval-ms", type=int, default=15)
+    parser.add_argument("--token-chars", type=int, default=4, help="characters per delta event")
+    parser.add_argument("--tokens-per-response", type=int, default=120, help="words per stubbed response")
+    parser.add_argument("--tool-ratio", type=float, default=0.5, help="share of turns that call a tool")
+    parser.add_argument("--search-share", type=float, default=0.3, help="share of tool calls that are tavily_search")
+    parser.add_argument("--search-ms", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the report rows to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = asyncio.run(run(args))
+    print("\n[SUMMARY]")
+    print_report(rows)
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2))
@@ -0,0 +1,62 @@
+import asyncio
+
+from utils.turn_scheduler import TurnScheduler
+
+
+def make_turn(log, name, duration=0.05):
+    async def turn():
+        log.append(f"start {name}")
+        try:
+            await asyncio.sleep(duration)
+        except asyncio.CancelledError:
+            log.append(f"cancel {name}")
+            raise
+        log.append(f"end {name}")
+    return turn
+
+
+def test_turn_superseded_before_first_step_is_dropped_in_order():
+    log = []
+
+    async def scenario():
+        scheduler = TurnScheduler()
+        a = asyncio.create_task(scheduler.submit(make_turn(log, "A"), on_dropped=lambda: log.append("drop A")))
+        await asyncio.sleep(0.01)  # A is running
+        # B and C arrive in the same loop tick
+        b = asyncio.create_task(scheduler.submit(make_turn(log, "B"), on_dropped=lambda: log.append("drop B")))
+        c = asyncio.create_task(scheduler.submit(make_turn(log, "C"), on_dropped=lambda: log.append("drop C")))
+        await asyncio.gather(a, b, c)
+
+    asyncio.run(scenario())
+    assert log == ["start A", "cancel A", "drop B", "start C", "end C"]
+
+
+def test_new_turn_cancels_running_turn():
+    log = []
+
+    async def scenario():
+        scheduler = TurnScheduler()
+        a = asyncio.create_task(scheduler.submit(make_turn(log, "A")))
+        await asyncio.sleep(0.01)
+        await scheduler.submit(make_turn(log, "B"))
+        await a
+
+    asyncio.run(scenario())
+    assert log == ["start A", "cancel A", "start B", "end B"]
+
+
+def test_caller_cancel_before_start_still_reports_drop():
+    log = []
+
+    async def scenario():
+        scheduler = TurnScheduler()
+        a = asyncio.create_task(scheduler.submit(make_turn(log, "A"), on_dropped=lambda: log.append("drop A")))
+        await asyncio.sleep(0.01)
+        b = asyncio.create_task(scheduler.submit(make_turn(log, "B"), on_dropped=lambda: log.append("drop B")))
+        await asyncio.sleep(0)
+        b.cancel()  # user pressed stop while B was queued
+        await asyncio.gather(a, b, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert log == ["start A", "cancel A", "drop B"]
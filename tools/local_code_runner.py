@@ -1,7 +1,11 @@
 # ----------------- Local Code Runner (sandboxed) -----------------
-import asyncio, subprocess, uuid, ast, textwrap, tempfile, sys, os
+import asyncio, subprocess, uuid, ast, textwrap, tempfile, sys, os, time
+from collections import deque
 from pathlib import Path
 from tools.types import ToolResult, ToolResultType
+from utils.logger_config import get_logger
+
+logger = get_logger("code_runner")
 
 ALLOWED_IMPORTS = {
     "pandas", "numpy",
@@ -11,6 +15,10 @@ ALLOWED_IMPORTS = {
     "math", "statistics", "json", "csv", "io"
 }
 
+SANDBOX_MAX_CONCURRENT = int(os.getenv("SANDBOX_MAX_CONCURRENT", str(os.cpu_count() or 4)))
+_sandbox_slots = asyncio.Semaphore(SANDBOX_MAX_CONCURRENT)
+sandbox_stats = {"runs": 0, "queue_waits": deque(maxlen=10000), "queue_wait_max": 0.0}
+
 DISALLOWED_NAMES = {
     "os", "sys", "subprocess", "shutil", "socket", "requests", "urllib",
     "pathlib", "builtins", "importlib", "ctypes"
@@ -49,12 +57,31 @@ def _validate_user_code(code: str) -> str | None:
     return None
 
 
-async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> list[ToolResult]:
-    """Execute code in isolated run dir with strict validations. Return list of ToolResult(s)."""
-    err = _validate_user_code(code)
-    if err:
-        return [ToolResult(type=ToolResultType.text, error=True, content=err)]
+MAX_VALUES_CHARS = 2000
+
+def _collect_emitted(workdir: Path) -> list[ToolResult]:
+    """Turn files written by emit_table()/emit_value() into ToolResults."""
+    emit_dir = workdir / "emitted"
+    if not emit_dir.is_dir():
+        return []
 
+    results = []
+    for path in sorted(emit_dir.iterdir()):
+        if path.name.endswith((".parquet", ".csv.gz")):
+            name = path.name.split(".", 1)[0].split("_", 1)[-1]
+            results.append(ToolResult(type=ToolResultType.table, content=str(path), desc=name))
+
+    values_path = emit_dir / "values.json"
+    if values_path.exists():
+        values = values_path.read_text(encoding="utf-8")
+        if len(values) > MAX_VALUES_CHARS:
+            values = values[:MAX_VALUES_CHARS] + "...[truncated]"
+        results.append(ToolResult(type=ToolResultType.text, content=f"[EMITTED VALUES]\n{values}"))
+    return results
+
+
+def prepare_sandbox(session_id: str) -> Path:
+    """Create a fresh run dir with the runner in place, ready for a script."""
     # run_root = Path("runs") / str(session_id)
     # run_root.mkdir(parents=True, exist_ok=True)
     # workdir = Path(tempfile.mkdtemp(prefix="code_run_", dir=run_root))
@@ -112,9 +139,36 @@ async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> li
                 print(f"[FIGURE_SAVE_ERROR]{e}")
         plt.show = _save_show
 
+        # Structured results: tables/values go to emitted/ instead of stdout
+        import json, re
+        EMIT_DIR = Path("emitted")
+        _emitted = {"tables": 0, "values": {}}
+        def emit_table(df, name=None):
+            if pd is None:
+                raise RuntimeError("pandas is required for emit_table()")
+            if not isinstance(df, pd.DataFrame):
+                df = pd.DataFrame(df)
+            if not isinstance(df.index, pd.RangeIndex):
+                df = df.reset_index()
+            df = df.rename(columns=str)  # new frame; the caller's columns stay untouched
+            EMIT_DIR.mkdir(exist_ok=True)
+            _emitted["tables"] += 1
+            name = name or f"table_{_emitted['tables']}"
+            stem = f"{_emitted['tables']:03d}_" + re.sub(r"[^A-Za-z0-9_-]", "_", str(name))[:50]
+            try:
+                df.to_parquet(EMIT_DIR / f"{stem}.parquet", index=False)
+            except Exception:  # no parquet engine installed
+                df.to_csv(EMIT_DIR / f"{stem}.csv.gz", index=False, compression="gzip")
+        def emit_value(name, value):
+            EMIT_DIR.mkdir(exist_ok=True)
+            _emitted["values"][str(name)] = value
+            with open(EMIT_DIR / "values.json", "w", encoding="utf-8") as f:
+                json.dump(_emitted["values"], f, default=str)
+
         code = open("script.py", "r", encoding="utf-8").read()
         # Build a minimal, explicit global namespace
-        g = {"pd": pd, "np": np, "plt": plt, "sns": sns, "px": px, "go": go}
+        g = {"pd": pd, "np": np, "plt": plt, "sns": sns, "px": px, "go": go,
+             "emit_table": emit_table, "emit_value": emit_value}
         exec(compile(code, "script.py", "exec"), g, None)
         
         # Detect if model saved its own figures (e.g., plt.savefig("..."))
@@ -146,8 +200,23 @@ async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> li
         #     except Exception as e:
         #         print(f"[FIGURE_SAVE_ERROR]{e}")
 
-    script_path.write_text(code, encoding="utf-8")
     runner_path.write_text(runner_src, encoding="utf-8")
+    return workdir
+
+
+async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str, workdir: Path | None = None) -> list[ToolResult]:
+    """
+    Execute code in isolated run dir with strict validations. Return list of ToolResult(s).
+    A dir reserved earlier with prepare_sandbox() can be passed as workdir.
+    """
+    err = _validate_user_code(code)
+    if err:
+        return [ToolResult(type=ToolResultType.text, error=True, content=err)]
+
+    workdir = workdir or prepare_sandbox(session_id)
+    script_path = workdir / "script.py"
+    runner_path = workdir / "runner.py"
+    script_path.write_text(code, encoding="utf-8")
 
     # Clean env (no proxies), headless
     env = os.environ.copy()
@@ -156,22 +225,38 @@ async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> li
             env.pop(k, None)
     env["MPLBACKEND"] = "Agg"
 
-    proc = await asyncio.create_subprocess_exec(
-        sys.executable, str(runner_path),
-        cwd=str(workdir),
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        env=env,
-    )
+    # Bounded number of concurrent sandbox processes; time spent waiting is tracked
+    queued_at = time.monotonic()
+    async with _sandbox_slots:
+        wait = time.monotonic() - queued_at
+        sandbox_stats["runs"] += 1
+        sandbox_stats["queue_waits"].append(wait)
+        sandbox_stats["queue_wait_max"] = max(sandbox_stats["queue_wait_max"], wait)
+
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, str(runner_path),
+            cwd=str(workdir),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+        )
 
-    try:
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout_sec)
-    except asyncio.TimeoutError:
         try:
-            proc.kill()
-        except Exception:
-            pass
-        return [ToolResult(type=ToolResultType.text, content=f"Execution timed out after {timeout_sec}s." , error=True)]
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout_sec)
+        except asyncio.TimeoutError:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+            return [ToolResult(type=ToolResultType.text, content=f"Execution timed out after {timeout_sec}s." , error=True)]
+        except asyncio.CancelledError:
+            # Turn superseded: don't leave the process running
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
 
     out = (stdout or b"").decode("utf-8", errors="ignore")
     err_txt = (stderr or b"").decode("utf-8", errors="ignore")
@@ -199,6 +284,9 @@ async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> li
         fname = os.path.basename(path)
         results.append(ToolResult(type=ToolResultType.image, content=path, desc=f"Generated figure {fname}"))
 
+    # Structured results from emit_table() / emit_value()
+    results.extend(_collect_emitted(workdir))
+
     
 
     # Then textual output (stdout + stderr)
@@ -214,5 +302,8 @@ async def run_code_sandboxed(code: str, timeout_sec: int, session_id: str) -> li
     if not results:
         results.append(ToolResult(type=ToolResultType.text, content="No output produced."))
 
-    print(f"Code run complete in {workdir}, results: {results}")
+    logger.info(
+        f"Code run complete in {workdir.name}: {len(results)} results "
+        f"({', '.join(r.type for r in results)}), {len(out)} chars stdout"
+    )
     return results
@@ -8,6 +8,7 @@ class ToolResultType(StrEnum):
     image = "image"
     pyplot = "pyplot"
     plotly = "plotly"
+    table = "table"  # content is a path to a table emitted via emit_table()
 
 
 class ToolResult(BaseModel):
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import re
+import shutil
+import threading
+import uuid
+import zipfile
+import zstandard
+from contextlib import contextmanager
+from pathlib import Path
+from pydantic import BaseModel
+
+from utils.logger_config import logger
+
+
+# ----------------- Archive Uploads -----------------
+ARCHIVE_SUFFIXES = (".gz", ".zst", ".zip")
+TABLE_EXTS = {".csv": ",", ".tsv": "\t"}
+MAX_ARCHIVE_MEMBERS = 50  # table members summarized per zip
+
+
+class LazyMember(BaseModel):
+    """A table inside an upload, extracted to its target path only when sandbox code uses it."""
+    archive: str
+    codec: str           # "zip" | "zst" | "gz"
+    member: str | None = None
+
+
+# session id -> {resolved target path -> where to stream it from}
+_lazy_members: dict[str, dict[str, LazyMember]] = {}
+_extract_locks: dict[str, threading.Lock] = {}  # one per target; speculative and real runs may race
+_registry_lock = threading.Lock()  # extraction runs in worker threads
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def table_sep(name: str) -> str | None:
+    """Delimiter for a (possibly compressed) table name, or None if it isn't a table."""
+    name = name.lower()
+    for suffix in (".gz", ".zst"):
+        name = name.removesuffix(suffix)
+    return TABLE_EXTS.get(Path(name).suffix)
+
+
+@contextmanager
+def open_member(entry: LazyMember):
+    """Binary stream of one member, decompressed on the fly."""
+    if entry.codec == "zip":
+        with zipfile.ZipFile(entry.archive) as zf, zf.open(entry.member) as f:
+            yield f
+    elif entry.codec == "gz":
+        with gzip.open(entry.archive, "rb") as f:
+            yield f
+    elif entry.codec == "zst":
+        with open(entry.archive, "rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as f:
+            yield f
+    else:
+        raise ValueError(f"Unknown codec: {entry.codec}")
+
+
+def register_lazy(session_id: str, target: Path, entry: LazyMember):
+    target = str(target.resolve())
+    with _registry_lock:
+        _lazy_members.setdefault(session_id, {})[target] = entry
+        _extract_locks.setdefault(target, threading.Lock())
+
+
+def drop_session_members(session_id: str):
+    """Forget a session's lazy members (called when the session ends)."""
+    with _registry_lock:
+        for target in _lazy_members.pop(session_id, {}):
+            _extract_locks.pop(target, None)
+
+
+def materialize_lazy_paths(code: str, session_id: str) -> list[str]:
+    """
+    Extract the session's registered archive members that the code refers to
+    by full path. Members are streamed to disk on first use, so untouched
+    members never take up space.
+    """
+    with _registry_lock:
+        members = [(t, e, _extract_locks[t]) for t, e in _lazy_members.get(session_id, {}).items()]
+
+    extracted = []
+    for target, entry, lock in members:
+        if target not in code:
+            continue
+        target_path = Path(target)
+        with lock:
+            if target_path.exists():
+                continue  # already extracted, possibly by a concurrent run
+            tmp = target_path.with_name(f"{target_path.name}.{uuid.uuid4().hex[:8]}.part")
+            try:
+                with open_member(entry) as src, open(tmp, "wb") as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
+                tmp.replace(target_path)
+            finally:
+                tmp.unlink(missing_ok=True)
+        extracted.append(target)
+        logger.info(f"[ARCHIVE] extracted {entry.member or Path(entry.archive).name} -> {target_path.name}")
+    return extracted
+
+
+def _summary_block(summarize, target: Path, entry: LazyMember, size_kb: float, note: str):
+    with open_member(entry) as f:
+        summary = summarize(str(target), source=f, sep=table_sep(entry.member or target.name),
+                            size_kb=size_kb, note=note)
+    return {"type": "input_text", "text": summary}
+
+
+def prepare_archive_for_api(path: Path, summarize) -> list[dict]:
+    """
+    Summarize the tables inside a .gz/.zst/.zip upload without inflating it on disk.
+    Each table member becomes its own summarized input. Its Path points to
+    where the member is extracted when sandbox code first uses it.
+    `summarize` is csv_utils.summarize_csv_for_prompt.
+    """
+    session_id = path.parent.name  # uploads live in .files/<session_id>/
+    name = path.name
+    lower = name.lower()
+
+    if lower.endswith((".gz", ".zst")):
+        codec = "gz" if lower.endswith(".gz") else "zst"
+        inner = path.with_name(name[: -len("." + codec)])
+        if table_sep(inner.name) is None:
+            return [{"type": "input_text", "text": f"[COMPRESSED FILE]\nPath: {path.resolve()}\nNote: {inner.name} is not a table; no preview."}]
+        entry = LazyMember(archive=str(path.resolve()), codec=codec)
+        if codec == "gz":
+            # pandas reads .gz transparently, so the sandbox can use the upload as-is
+            target, note = path, "gzip-compressed; pandas.read_csv reads this path directly"
+        else:
+            # Prefixed like zip members so it can't collide with an upload named `inner`
+            target = path.with_name(f"{path.stem.removesuffix(inner.suffix)}__{inner.name}")
+            note = f"decompressed from {name} on first use in code"
+            register_lazy(session_id, target, entry)
+        return [_summary_block(summarize, target, entry, round(path.stat().st_size / 1024, 1), note)]
+
+    # .zip: one summary per table member, plus an index
+    blocks, skipped = [], []
+    with zipfile.ZipFile(path) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir() and not m.filename.startswith("__MACOSX/")]
+    tables = [m for m in members if table_sep(m.filename)]
+    others = [m.filename for m in members if not table_sep(m.filename)]
+    if len(tables) > MAX_ARCHIVE_MEMBERS:
+        skipped = [m.filename for m in tables[MAX_ARCHIVE_MEMBERS:]]
+        tables = tables[:MAX_ARCHIVE_MEMBERS]
+
+    used_names = set()
+    for m in tables:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", m.filename)
+        if safe.lower() in used_names:
+            # Sanitizing is lossy (r1/a.csv vs r1_a.csv); disambiguate by the original name
+            tag = hashlib.sha256(m.filename.encode("utf-8")).hexdigest()[:8]
+            safe = f"{Path(safe).stem}_{tag}{Path(safe).suffix}"
+        used_names.add(safe.lower())
+        target = path.with_name(f"{path.stem}__{safe}")
+        entry = LazyMember(archive=str(path.resolve()), codec="zip", member=m.filename)
+        register_lazy(session_id, target, entry)
+        try:
+            blocks.append(_summary_block(summarize, target, entry, round(m.file_size / 1024, 1),
+                                         f"member {m.filename} of {name}, extracted on first use in code"))
+        except Exception as e:
+            blocks.append({"type": "input_text", "text": f"[CSV SUMMARY ERROR]\nPath: {target.resolve()}\nError: {e}"})
+
+    index = [
+        "[ARCHIVE]",
+        f"Name: {name}",
+        f"Members: {len(members)} ({len(tables)} tables summarized below)",
+    ]
+    if others:
+        index.append(f"Other members (no preview): {others[:20]}")
+    if skipped:
+        index.append(f"Tables not summarized (limit {MAX_ARCHIVE_MEMBERS}): {skipped[:20]}")
+    return [{"type": "input_text", "text": "\n".join(index)}] + blocks
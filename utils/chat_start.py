@@ -1,13 +1,15 @@
 import chainlit as cl
 import logging
+import os
 from chainlit.input_widget import Select, Slider, Switch
 from db import initialize_json
-from utils.logger_config import logger
+from utils.logger_config import logger, bind_session
 
 
 # ----------------- Chat Start -----------------
 @cl.on_chat_start
 async def start():
+    bind_session(cl.user_session.get("id"))
     logger.info("Chat started.")
     settings = await cl.ChatSettings(
         [
@@ -22,6 +24,8 @@ async def start():
             Slider(id="temperature", label="LLM - Temperature",
                    min=0, max=2, step=0.1, initial=0.7),
             Switch(id="stream", label="Stream Tokens", initial=True),
+            Switch(id="cache_responses", label="Cache Repeated Prompts",
+                   initial=os.getenv("RESPONSE_CACHE", "0") == "1"),
         ]
     ).send()
 
@@ -51,7 +55,8 @@ async def start():
                 "- When generating code, prefer to use safe libraries: `pandas`, `numpy`, `matplotlib` and `seaborn`.\n"
                 "- Never use network or OS-level operations; all code is run in a local sandbox.\n"
                 "- When writing analysis code, **read data from the provided file path**, not from inline text and always use the full file path.\n"
-                "- Do not save CSVs; print results instead. Use plt.savefig() for plots.\n"
+                "- Do not save CSVs; return tables with `emit_table(df, name)` and key numbers with `emit_value(name, value)` instead of printing them. "
+                "The user sees the full table; you receive a compact digest. Use plt.savefig() for plots.\n"
                 "- Do not re-display generated plots or sandbox images — only describe them textually.\n"
                 "- Reject multi-part queries politely: always ask the user to rephrase or split their request into smaller, single-goal tasks.\n"
                 "- Use visualization best practices: labeled axes, descriptive titles, and saved PNGs.\n"
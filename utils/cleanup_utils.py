@@ -1,9 +1,12 @@
 import shutil
 from pathlib import Path
-import logging, atexit
+import atexit
 import chainlit as cl
 
-logger = logging.getLogger(__name__)
+from utils.archive_utils import drop_session_members
+from utils.logger_config import get_logger
+
+logger = get_logger("cleanup")
 
 @cl.on_chat_end
 def cleanup_session():
@@ -11,6 +14,7 @@ def cleanup_session():
     session_id = cl.user_session.get("id")
     if not session_id:
         return
+    drop_session_members(session_id)
 
     base_dir = Path(__file__).resolve().parent.parent 
     run_dir = base_dir / session_id
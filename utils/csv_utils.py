@@ -4,6 +4,9 @@ from pathlib import Path
 import pandas as pd
 import base64
 
+from utils.archive_utils import is_archive, prepare_archive_for_api
+from utils.logger_config import logger
+
 
 # ----------------- CSV Summaries -----------------
 CSV_SAMPLE_ROWS = 6
@@ -12,23 +15,32 @@ CSV_MAX_COLS_LIST = 24  # Max columns to list in summary
 def summarize_csv_for_prompt(file_path: str,
                              sample_rows: int = 6,
                              max_cols_list: int = 24,
-                             top_n_values: int = 5) -> str:
+                             top_n_values: int = 5,
+                             source=None,
+                             sep: str = ",",
+                             size_kb: float | None = None,
+                             note: str | None = None) -> str:
     """
     Produce a concise yet information-dense summary of a CSV for LLM prompting.
     Includes schema, descriptive stats, value distributions, and a JSON preview.
+    `source` lets the rows come from an open stream (e.g. an archive member)
+    while `file_path` is the path the sandbox will read.
     """
     p = Path(file_path)
-    size_kb = round(p.stat().st_size / 1024, 1)
+    if size_kb is None:
+        size_kb = round(p.stat().st_size / 1024, 1)
     summary_lines = [
         f"[CSV SUMMARY]",
         f"Path: {p.resolve()}",
         f"Name: {p.name}",
         f"Size: {size_kb} KB",
     ]
+    if note:
+        summary_lines.append(f"Source: {note}")
 
     try:
         # Load small sample + infer types
-        df = pd.read_csv(file_path, nrows=2000)  # read max 2000 rows for summary
+        df = pd.read_csv(source if source is not None else file_path, sep=sep, nrows=2000)  # read max 2000 rows for summary
     except Exception as e:
         return "\n".join(summary_lines + [f"Error reading CSV: {e}"])
 
@@ -85,6 +97,7 @@ def prepare_file_for_api(file_el):
     - CSV/TSV: summarized via summarize_csv_for_prompt()
     - TXT/JSON: short textual preview
     - Images: base64-encoded
+    - .gz/.zst/.zip: each table inside summarized from a stream
     - Other: path info only
     """
     p = Path(file_el.path)
@@ -101,14 +114,22 @@ def prepare_file_for_api(file_el):
         shutil.copy(p, new_path)
 
     ext = p.suffix.lower()
-    print('file path',p)
-    print('new path',new_path)
-    print('file ext',ext)
+    logger.info(f"Preparing upload {original_name}: {p} -> {new_path} (ext={ext or 'none'})")
+
+    # Compressed tables / zip bundles -> one summary per table, streamed
+    if is_archive(new_path.name):
+        try:
+            return prepare_archive_for_api(new_path, summarize_csv_for_prompt), None
+        except Exception as e:
+            return [{
+                "type": "input_text",
+                "text": f"[ARCHIVE ERROR]\nPath: {new_path.resolve()}\nError: {e}"
+            }], e
 
     # CSV / TSV -> full data summary
     if ext in [".csv", ".tsv"]:
         try:
-            summary = summarize_csv_for_prompt(str(new_path))
+            summary = summarize_csv_for_prompt(str(new_path), sep="\t" if ext == ".tsv" else ",")
         except Exception as e:
             summary = f"[CSV SUMMARY ERROR]\nPath: {new_path.resolve()}\nError: {e}"
         return [{
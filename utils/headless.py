@@ -0,0 +1,135 @@
+import atexit
+import shutil
+import time
+import uuid
+from pathlib import Path
+import chainlit as cl
+from chainlit.context import init_http_context
+from chainlit.emitter import BaseChainlitEmitter
+from chainlit.user_session import user_sessions
+
+from utils.archive_utils import drop_session_members
+from utils.chat_start import start
+from utils.cleanup_utils import cleanup_on_exit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RETRY_STATUS_PREFIXES = ("⚙️ Attempt", "✅ Code fixed")  # progress lines sent by handle_code_retry
+
+# Headless drivers import main alongside a possibly running server; wiping all
+# of runs/ at exit would delete live sessions' sandbox dirs. Each headless
+# session removes its own dirs in close_headless_session() instead.
+atexit.unregister(cleanup_on_exit)
+
+
+# ----------------- Headless Sessions -----------------
+class RecordingEmitter(BaseChainlitEmitter):
+    """
+    Stands in for the websocket emitter when no browser is attached.
+    Keeps the messages and elements the UI would have received, and
+    timestamps streamed frames so callers can measure time to first token.
+    """
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.steps: dict[str, dict] = {}
+        self.elements: list[dict] = []
+        self.frames = 0
+        self.first_frame_at: float | None = None
+        self._setup_steps: set[str] = set()  # sent by the chat start hook (welcome banner)
+
+    def mark_setup_done(self):
+        self._setup_steps = set(self.steps)
+
+    def reset_turn(self):
+        self.first_frame_at = None
+
+    def _frame(self):
+        self.frames += 1
+        if self.first_frame_at is None:
+            self.first_frame_at = time.monotonic()
+
+    async def send_step(self, step_dict):
+        self.steps[step_dict["id"]] = step_dict
+
+    async def update_step(self, step_dict):
+        self.steps[step_dict["id"]] = step_dict
+
+    async def stream_start(self, step_dict):
+        self._frame()
+
+    async def send_token(self, id, token, is_sequence=False, is_input=False):
+        self._frame()
+
+    async def send_element(self, element_dict):
+        self.elements.append(element_dict)
+
+    def _turn_steps(self, step_type: str) -> list[dict]:
+        return [
+            step for step_id, step in self.steps.items()
+            if step_id not in self._setup_steps and step.get("type") == step_type
+        ]
+
+    def _message_outputs(self) -> list[str]:
+        return [step["output"] for step in self._turn_steps("assistant_message") if step.get("output")]
+
+    def assistant_messages(self) -> list[str]:
+        """The assistant's answers, without the welcome banner or code retry status lines."""
+        return [m for m in self._message_outputs() if not m.startswith(RETRY_STATUS_PREFIXES)]
+
+    def successful_tool_outputs(self) -> list[str]:
+        """Outputs of tool steps that returned no error results."""
+        outputs = [str(step.get("output", "")) for step in self._turn_steps("tool")]
+        return [out for out in outputs if "error=True" not in out]
+
+    def failures(self) -> dict[str, int]:
+        """
+        Failures the UI would have shown. run_turn turns exceptions into chat
+        messages, so they never reach the caller.
+        - turn_errors: "❌ Error" messages (the whole turn failed)
+        - tool_errors: tool steps whose results were errors
+        - code_retries: repair attempts after failed code runs
+        - unrecovered_code_errors: failed code runs still failing after all retries
+        """
+        messages = self._message_outputs()
+        repair_loops = sum(m.startswith("⚙️ Attempt 1:") for m in messages)
+        repaired = sum(m.startswith("✅ Code fixed") for m in messages)
+        return {
+            "turn_errors": sum(m.startswith("❌ Error") for m in messages),
+            "tool_errors": sum("error=True" in str(step.get("output", "")) for step in self._turn_steps("tool")),
+            "code_retries": sum(m.startswith("⚙️ Attempt") for m in messages),
+            "unrecovered_code_errors": max(repair_loops - repaired, 0),
+        }
+
+
+async def open_headless_session() -> tuple[str, RecordingEmitter]:
+    """
+    Create a chainlit session without a websocket and run the chat start hook.
+    Must be called from the task that will drive the session.
+    """
+    ctx = init_http_context()
+    emitter = RecordingEmitter(ctx.session)
+    ctx.emitter = emitter
+    await start()
+    emitter.mark_setup_done()
+    return ctx.session.id, emitter
+
+
+def stage_upload(path: Path, session_id: str) -> cl.File:
+    """Copy a file into the session's upload dir, as the UI upload would."""
+    upload_dir = BASE_DIR / ".files" / session_id
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    staged = upload_dir / f"upload_{uuid.uuid4().hex[:8]}{''.join(path.suffixes)}"
+    shutil.copy(path, staged)
+    return cl.File(path=str(staged), name=path.name)
+
+
+def user_message(text: str, elements=None) -> cl.Message:
+    return cl.Message(content=text, elements=elements or [], author="User", type="user_message")
+
+
+def close_headless_session(session_id: str):
+    """Drop the session's state, uploads and sandbox run dirs."""
+    user_sessions.pop(session_id, None)
+    drop_session_members(session_id)
+    for path in (BASE_DIR / ".files" / session_id, BASE_DIR / "runs" / session_id):
+        shutil.rmtree(path, ignore_errors=True)
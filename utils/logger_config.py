@@ -1,13 +1,128 @@
 # utils/logger_config.py
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # rotate at 10 MB
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_QUEUE_SIZE = 10000
+
+# Fraction of records kept for high-volume events, tagged with extra={"event": ...}.
+# Warnings and errors are never sampled out.
+SAMPLE_RATES = {"stream": 0.1, "cache": 0.25}
+
+# Correlation ids, set per session / per turn and inherited by tasks they spawn
+session_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("session_id", default=None)
+turn_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("turn_id", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """Adds correlation ids, samples high-volume events and truncates payloads before queueing."""
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        rate = SAMPLE_RATES.get(event)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        record.event = event
+        record.sample_rate = rate or 1.0
+        record.session_id = session_id_var.get()
+        record.turn_id = turn_id_var.get()
+
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = message[:LOG_MAX_MESSAGE_CHARS] + f"...[truncated {len(message) - LOG_MAX_MESSAGE_CHARS} chars]"
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "session_id": getattr(record, "session_id", None),
+            "turn_id": getattr(record, "turn_id", None),
+        }
+        if getattr(record, "event", None):
+            entry["event"] = record.event
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the event loop: when the queue is full the record is dropped and counted."""
+    dropped = 0
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        """
+        Unlike the base class, keep the traceback out of msg: it goes in
+        exc_text (the JSON "exc" field), truncated to its last
+        LOG_MAX_MESSAGE_CHARS, since the end of a traceback says the most.
+        """
+        record = copy.copy(record)
+        exc_text = record.exc_text
+        if record.exc_info:
+            exc_text = self._exc_formatter.formatException(record.exc_info)
+        if exc_text and len(exc_text) > LOG_MAX_MESSAGE_CHARS:
+            exc_text = f"[truncated {len(exc_text) - LOG_MAX_MESSAGE_CHARS} chars]..." + exc_text[-LOG_MAX_MESSAGE_CHARS:]
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        record.exc_info, record.exc_text, record.stack_info = None, exc_text, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
 
 logger = logging.getLogger("biochem_app")
 if not logger.handlers:  # prevent duplicate handlers when reloaded
+    # Handlers doing I/O run on the listener thread, not the event loop
     handler = logging.StreamHandler()
-    file_handler = logging.FileHandler("app.log")
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.addHandler(file_handler)
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - [%(session_id)s/%(turn_id)s] %(message)s"
+    ))
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(log_queue, handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(queue_handler)
     logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Child of the app logger, so records go through the same queue."""
+    return logger.getChild(name)
+
+
+def bind_session(session_id: str | None):
+    session_id_var.set(session_id)
+
+
+def bind_turn(turn_id: str | None):
+    turn_id_var.set(turn_id)
@@ -0,0 +1,82 @@
+from pydantic import BaseModel
+
+from utils.logger_config import logger
+
+
+# ----------------- Routing Config -----------------
+FAST_TIERS = ["gpt-4.1-nano", "gpt-4.1-mini"]  # fastest first
+ROUTED_CALLS = {"repair", "followup"}          # narrow jobs that don't need the user's model
+MIN_SAMPLES = 5                                # stats needed before a tier can be demoted
+MIN_SUCCESS_RATE = 0.6
+EXPLORE_EVERY = 10                             # retry a demoted tier every N decisions
+EWMA_ALPHA = 0.2
+
+
+class RouteStats(BaseModel):
+    samples: int = 0
+    success_rate: float = 1.0
+    latency: float = 0.0   # EWMA seconds
+    skipped: int = 0
+
+    def record(self, latency: float, success: bool):
+        if self.samples == 0:
+            self.latency, self.success_rate = latency, float(success)
+        else:
+            self.latency += EWMA_ALPHA * (latency - self.latency)
+            self.success_rate += EWMA_ALPHA * (float(success) - self.success_rate)
+        self.samples += 1
+
+
+class ModelRouter:
+    """
+    Picks the model for each LLM call by route.
+    - "primary" calls always use the model the user chose
+    - "repair"/"followup" calls start on the fastest viable tier and
+      escalate to the chosen model after a failure
+    A fast tier is skipped for a route while its success rate is below
+    MIN_SUCCESS_RATE or it is no faster than the chosen model.
+    """
+
+    def __init__(self):
+        self.stats: dict[tuple[str, str], RouteStats] = {}
+
+    def _stats(self, route: str, model: str) -> RouteStats:
+        return self.stats.setdefault((route, model), RouteStats())
+
+    def _viable(self, route: str, model: str, chosen: str) -> bool:
+        st = self._stats(route, model)
+        if st.samples < MIN_SAMPLES:
+            return True
+        chosen_st = self._stats(route, chosen)
+        too_slow = chosen_st.samples >= MIN_SAMPLES and st.latency >= chosen_st.latency
+        if st.success_rate >= MIN_SUCCESS_RATE and not too_slow:
+            return True
+        st.skipped += 1
+        return st.skipped % EXPLORE_EVERY == 0  # occasionally re-sample so a tier can recover
+
+    def ladder(self, route: str, chosen: str) -> list[str]:
+        """Models to try in order for this call."""
+        if route not in ROUTED_CALLS:
+            return [chosen]
+        fast = FAST_TIERS[:FAST_TIERS.index(chosen)] if chosen in FAST_TIERS else FAST_TIERS
+        for model in fast:
+            if self._viable(route, model, chosen):
+                return [model, chosen]
+        return [chosen]
+
+    def pick(self, route: str, chosen: str, ladder: list[str], attempt: int = 0) -> str:
+        """Model for this attempt; `ladder` is computed once per call with ladder()."""
+        model = ladder[min(attempt, len(ladder) - 1)]
+        logger.info(f"[ROUTER] route={route} attempt={attempt + 1} chosen={chosen} -> {model}")
+        return model
+
+    def record(self, route: str, model: str, latency: float, success: bool):
+        st = self._stats(route, model)
+        st.record(latency, success)
+        logger.info(
+            f"[ROUTER] route={route} model={model} success={success} "
+            f"latency_ewma={st.latency:.2f}s success_rate={st.success_rate:.0%} n={st.samples}"
+        )
+
+
+model_router = ModelRouter()
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from pydantic import BaseModel, Field
+
+from utils.logger_config import logger
+
+
+# ----------------- Response Cache Config -----------------
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL_SEC = int(os.getenv("RESPONSE_CACHE_TTL_SEC", "3600"))
+
+BYPASS_TOOLS = {"tavily_search"}  # results change over time, never replay them
+TIME_SENSITIVE_PATTERN = re.compile(r"\b(latest|recent|today|current|news|this year)\b", re.IGNORECASE)
+PATH_LINE_PATTERN = re.compile(r"^Path: (.+)$", re.MULTILINE)
+
+
+class CachedOutputItem(BaseModel):
+    type: str
+    name: str = ""
+    arguments: str = ""
+    id: str = ""
+
+
+class CachedUsage(BaseModel):
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class CachedResponse(BaseModel):
+    """Mirrors the parts of an OpenAI Response that on_message reads."""
+    output_text: str = ""
+    output: list[CachedOutputItem] = Field(default_factory=list)
+    usage: CachedUsage = Field(default_factory=CachedUsage)
+    cached: bool = True
+
+
+class CacheKey(BaseModel):
+    digest: str
+    file_hashes: dict[str, str] = Field(default_factory=dict)  # local path -> content hash
+
+
+FILE_HASH_MEMO_SIZE = 1024
+_file_hash_memo: OrderedDict[tuple[str, int, int], str] = OrderedDict()  # LRU, bounded
+_file_hash_memo_lock = threading.Lock()  # keys are built in worker threads
+
+
+def _file_hash(path: str) -> str | None:
+    p = Path(path)
+    if not p.is_file():
+        return None
+    st = p.stat()
+    memo_key = (str(p), st.st_size, st.st_mtime_ns)
+    with _file_hash_memo_lock:
+        if memo_key in _file_hash_memo:
+            _file_hash_memo.move_to_end(memo_key)
+            return _file_hash_memo[memo_key]
+
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:16]
+    with _file_hash_memo_lock:
+        _file_hash_memo[memo_key] = digest
+        while len(_file_hash_memo) > FILE_HASH_MEMO_SIZE:
+            _file_hash_memo.popitem(last=False)
+    return digest
+
+
+def _placeholder(file_hash: str) -> str:
+    return f"<<file:{file_hash}>>"
+
+
+def _normalize_input(items, file_hashes: dict[str, str]):
+    """
+    Reduce input items to a session-independent form.
+    - Upload paths are replaced by the hash of the file they point to
+    - Inline images are replaced by the hash of their data URL
+    """
+    normalized = []
+    for item in items:
+        content = item.get("content", [])
+        if isinstance(content, str):
+            content = [{"type": "input_text", "text": content}]
+
+        parts = []
+        for part in content:
+            if part.get("type") == "input_image":
+                url = part.get("image_url", "")
+                parts.append({"type": "input_image", "sha256": hashlib.sha256(url.encode()).hexdigest()})
+                continue
+
+            text = part.get("text", "")
+            for path in PATH_LINE_PATTERN.findall(text):
+                path = path.strip()
+                if path not in file_hashes:
+                    digest = _file_hash(path)
+                    if digest is None:
+                        continue
+                    file_hashes[path] = digest
+            for path, digest in file_hashes.items():
+                text = text.replace(path, _placeholder(digest))
+            parts.append({"type": part.get("type"), "text": text})
+
+        normalized.append({"role": item.get("role"), "content": parts})
+    return normalized
+
+
+def _is_time_sensitive(items) -> bool:
+    """Bypass when the turn depends on web results or asks for up-to-date information."""
+    texts = [
+        part.get("text", "")
+        for item in items
+        for part in (item.get("content") or [])
+        if isinstance(part, dict)
+    ]
+    if any(f"Tool `{tool}` result" in t for t in texts for tool in BYPASS_TOOLS):
+        return True
+
+    # Only the text the user typed (first part); file summaries follow it and
+    # may contain words like "current" as column names or values
+    user_items = [item for item in items if item.get("role") == "user"]
+    if user_items:
+        content = user_items[-1].get("content") or []
+        typed = content if isinstance(content, str) else next(
+            (p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "input_text"), ""
+        )
+        if TIME_SENSITIVE_PATTERN.search(typed):
+            return True
+    return False
+
+
+def _build_key(model: str, temperature, tools, input_items) -> CacheKey:
+    file_hashes: dict[str, str] = {}
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "tools": tools,
+        "input": _normalize_input(input_items, file_hashes),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return CacheKey(digest=hashlib.sha256(canonical.encode("utf-8")).hexdigest(), file_hashes=file_hashes)
+
+
+# ----------------- Response Cache -----------------
+class ResponseCache:
+    """
+    Exact-match cache for model responses, bounded by TTL and LRU size.
+    Shared across sessions so repeated demo/lab prompts on the same files hit.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_sec: int = CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "evicted": 0, "expired": 0}
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    async def key_for(self, model: str, temperature, tools, input_items) -> CacheKey | None:
+        """Build the canonical key for a request, or None if it must bypass the cache."""
+        if _is_time_sensitive(input_items):
+            self.stats["bypassed"] += 1
+            return None
+        # Hashing uploads reads whole files; keep it off the event loop
+        return await asyncio.to_thread(_build_key, model, temperature, tools, input_items)
+
+    def lookup(self, key: CacheKey) -> CachedResponse | None:
+        entry = self._entries.get(key.digest)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl_sec:
+            del self._entries[key.digest]
+            self.stats["expired"] += 1
+            entry = None
+
+        if entry is None:
+            self.stats["misses"] += 1
+            logger.info(f"[CACHE] miss {key.digest[:12]} (hit rate {self.hit_rate:.0%})", extra={"event": "cache"})
+            return None
+
+        self._entries.move_to_end(key.digest)
+        self.stats["hits"] += 1
+        logger.info(f"[CACHE] hit {key.digest[:12]} (hit rate {self.hit_rate:.0%})", extra={"event": "cache"})
+
+        # Point file placeholders back at this session's copies of the files
+        cached = entry[1]
+        return CachedResponse(
+            output_text=_restore_paths(cached.output_text, key.file_hashes),
+            output=[
+                item.model_copy(update={
+                    "arguments": _restore_paths(item.arguments, key.file_hashes),
+                    "id": f"fc_cached_{uuid.uuid4().hex[:12]}" if item.type == "function_call" else item.id,
+                })
+                for item in cached.output
+            ],
+        )
+
+    def store(self, key: CacheKey, response) -> None:
+        """Cache a final response unless it failed or called a time-sensitive tool."""
+        if getattr(response, "status", "completed") != "completed" or getattr(response, "error", None):
+            return
+
+        output = []
+        for item in response.output or []:
+            if item.type in ["tool_call", "function_call"]:
+                if item.name in BYPASS_TOOLS:
+                    self.stats["bypassed"] += 1
+                    return
+                output.append(CachedOutputItem(
+                    type=item.type, name=item.name,
+                    arguments=_strip_paths(item.arguments, key.file_hashes), id=item.id,
+                ))
+            else:
+                output.append(CachedOutputItem(type=item.type))
+
+        self._entries[key.digest] = (time.monotonic(), CachedResponse(
+            output_text=_strip_paths(response.output_text or "", key.file_hashes),
+            output=output,
+        ))
+        self._entries.move_to_end(key.digest)
+        self.stats["stored"] += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+
+def _strip_paths(text: str, file_hashes: dict[str, str]) -> str:
+    for path, digest in file_hashes.items():
+        text = text.replace(path, _placeholder(digest))
+    return text
+
+
+def _restore_paths(text: str, file_hashes: dict[str, str]) -> str:
+    for path, digest in file_hashes.items():
+        text = text.replace(_placeholder(digest), path)
+    return text
+
+
+response_cache = ResponseCache()
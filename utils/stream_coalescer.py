@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+
+from utils.logger_config import logger
+
+
+# ----------------- Coalescer Config -----------------
+FLUSH_WINDOW_MS = int(os.getenv("STREAM_FLUSH_WINDOW_MS", "50"))    # ~20 frames/s, still smooth to the eye
+FLUSH_MAX_WINDOW_MS = 400                                           # upper bound when a client falls behind
+FLUSH_MAX_BYTES = int(os.getenv("STREAM_FLUSH_MAX_BYTES", "512"))   # flush early on large bursts
+HIGH_WATER_BYTES = 64 * 1024                                        # pause the upstream reader beyond this
+
+# Process-wide totals, read by the load test harness
+stream_stats = {"frames": 0, "deltas": 0, "bytes": 0, "flush_latency_sum": 0.0, "flush_latency_max": 0.0, "backpressure_waits": 0}
+
+
+class TokenCoalescer:
+    """
+    Sits between the OpenAI event stream and a chainlit message.
+    Deltas are buffered and sent as one websocket frame when the time window
+    elapses or the byte threshold is reached, whichever comes first.
+    The window widens when sends are slow (client falling behind) and
+    shrinks back as they recover; past HIGH_WATER_BYTES push() waits.
+    """
+
+    def __init__(self, msg, window_ms: int = FLUSH_WINDOW_MS, max_bytes: int = FLUSH_MAX_BYTES):
+        self.msg = msg
+        self.base_window = window_ms / 1000
+        self.window = self.base_window
+        self.max_bytes = max_bytes
+
+        self._buf: list[str] = []
+        self._buf_bytes = 0
+        self._has_data = asyncio.Event()
+        self._full = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._closed = False
+        self._error: BaseException | None = None
+        self._writer = asyncio.create_task(self._write_loop())
+
+        self.frames = 0
+        self.deltas = 0
+        self.bytes = 0
+        self.flush_latency_sum = 0.0
+        self.flush_latency_max = 0.0
+        self._started = time.monotonic()
+
+    async def push(self, delta: str):
+        if self._error:
+            raise self._error
+        if not delta:
+            return
+        size = len(delta.encode("utf-8"))
+        self._buf.append(delta)
+        self._buf_bytes += size
+        self.deltas += 1
+        self._has_data.set()
+        if self._buf_bytes >= self.max_bytes:
+            self._full.set()
+
+        # Backpressure: stop reading upstream until the writer catches up
+        if self._buf_bytes >= HIGH_WATER_BYTES:
+            self._drained.clear()
+            stream_stats["backpressure_waits"] += 1
+            await self._drained.wait()
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._has_data.wait()
+                if not self._closed:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), timeout=self.window)
+                    except asyncio.TimeoutError:
+                        pass
+
+                chunk = "".join(self._buf)
+                self._buf.clear()
+                self._buf_bytes = 0
+                self._has_data.clear()
+                self._full.clear()
+                self._drained.set()
+
+                if chunk:
+                    t0 = time.monotonic()
+                    await self.msg.stream_token(chunk)
+                    self._record_flush(chunk, time.monotonic() - t0)
+
+                if self._closed and not self._buf:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            self._error = e
+            self._drained.set()
+
+    def _record_flush(self, chunk: str, latency: float):
+        size = len(chunk.encode("utf-8"))
+        self.frames += 1
+        self.bytes += size
+        self.flush_latency_sum += latency
+        self.flush_latency_max = max(self.flush_latency_max, latency)
+        stream_stats["frames"] += 1
+        stream_stats["bytes"] += size
+        stream_stats["flush_latency_sum"] += latency
+        stream_stats["flush_latency_max"] = max(stream_stats["flush_latency_max"], latency)
+
+        # Adapt: a send slower than the window means the client is behind
+        if latency > self.window:
+            self.window = min(self.window * 2, FLUSH_MAX_WINDOW_MS / 1000)
+        elif latency < self.window / 4:
+            self.window = max(self.window / 2, self.base_window)
+
+    async def close(self):
+        """Flush whatever is buffered and stop the writer."""
+        self._closed = True
+        self._has_data.set()
+        self._full.set()
+        try:
+            await self._writer
+        finally:
+            stream_stats["deltas"] += self.deltas
+
+        if self._error:
+            raise self._error
+
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        avg_latency = self.flush_latency_sum / self.frames if self.frames else 0.0
+        logger.info(
+            f"[STREAM] {self.deltas} deltas -> {self.frames} frames ({self.frames / elapsed:.1f} fps), "
+            f"{self.bytes} bytes, flush latency avg={avg_latency * 1000:.1f}ms max={self.flush_latency_max * 1000:.1f}ms",
+            extra={"event": "stream"},
+        )
+
+    def abort(self):
+        """Drop buffered tokens and stop the writer without flushing."""
+        self._closed = True
+        self._buf.clear()
+        self._writer.cancel()
+        self._drained.set()
@@ -0,0 +1,59 @@
+import json
+import pandas as pd
+
+
+# ----------------- Emitted Table Digests -----------------
+MAX_UI_ROWS = 5000        # rows sent to the chainlit Dataframe element
+MAX_DIGEST_CHARS = 2500   # hard cap on what the model sees per table
+DIGEST_MAX_COLS = 20
+DIGEST_PREVIEW_ROWS = 5
+
+
+def load_table(path: str) -> pd.DataFrame:
+    """Load a table written by the sandbox's emit_table()."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, compression="gzip")
+
+
+def ui_rows_label(nrows: int) -> str:
+    """What the chainlit Dataframe element shows of a table with nrows rows."""
+    if nrows > MAX_UI_ROWS:
+        return f"first {MAX_UI_ROWS} of {nrows} rows"
+    return "full table"
+
+
+def digest_table(df: pd.DataFrame, name: str, top_n_values: int = 3) -> str:
+    """
+    Bounded statistical digest of a table for the model.
+    The table (up to MAX_UI_ROWS rows) is shown to the user, so only shape,
+    per-column stats and a few rows are sent back into the history.
+    """
+    nrows, ncols = df.shape
+    lines = [f"[TABLE] {name}", f"Shape: {nrows}×{ncols} ({ui_rows_label(nrows)} shown to the user)"]
+
+    cols = list(df.columns)
+    if ncols > DIGEST_MAX_COLS:
+        lines.append(f"(Showing first {DIGEST_MAX_COLS} of {ncols} columns)")
+        cols = cols[:DIGEST_MAX_COLS]
+
+    lines.append("[COLUMNS]")
+    for c in cols:
+        s = df[c]
+        nulls = int(s.isna().sum())
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s) and s.notna().any():
+            lines.append(
+                f"- {c} ({s.dtype}): min={s.min():.4g}, median={s.median():.4g}, "
+                f"max={s.max():.4g}, {nulls} nulls"
+            )
+        else:
+            top_vals = list(s.dropna().astype(str).value_counts().index[:top_n_values])
+            lines.append(f"- {c} ({s.dtype}): {s.nunique(dropna=True)} unique, top={top_vals}, {nulls} nulls")
+
+    preview = df[cols].head(DIGEST_PREVIEW_ROWS).to_dict(orient="records")
+    lines += ["[HEAD]", json.dumps(preview, ensure_ascii=False, default=str)]
+
+    digest = "\n".join(lines)
+    if len(digest) > MAX_DIGEST_CHARS:
+        digest = digest[:MAX_DIGEST_CHARS] + "\n...[truncated]"
+    return digest
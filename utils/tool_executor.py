@@ -1,12 +1,16 @@
+import asyncio
 import json
-import logging
+import time
 from tools.types import ToolResult, ToolResultType
-from tools.local_code_runner import run_code_sandboxed
+from tools.local_code_runner import run_code_sandboxed, prepare_sandbox, _validate_user_code
 from utils.tavily_utils import tavily_search
+from utils.model_router import model_router
+from utils.archive_utils import materialize_lazy_paths
+from utils.logger_config import get_logger
 import chainlit as cl
 from typing import Any, Dict
 
-logger = logging.getLogger(__name__)
+logger = get_logger("tool_executor")
 MAX_CODE_RETRIES = 2
 
 
@@ -45,7 +49,12 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]):
                 return [ToolResult(type=ToolResultType.text, content="No code provided." , error=True)]
             session_id = cl.user_session.get("id")
             try:
-                results = await run_code_sandboxed(code, timeout, session_id)
+                speculative = _claim_speculative_run(tool_name, tool_input)
+                if speculative is not None:
+                    logger.info("Using speculative code run started while the response was streaming.")
+                    results = await speculative
+                else:
+                    results = await _run_code(code, timeout, session_id)
                 logger.info(f"Code runner executed with {len(results)} results.")
                 return results
             except Exception as e:
@@ -59,13 +68,96 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]):
 
 
 
+async def _run_code(code: str, timeout: int, session_id: str, workdir=None):
+    # Archive members referenced by the code are extracted just before the run
+    await asyncio.to_thread(materialize_lazy_paths, code, session_id)
+    return await run_code_sandboxed(code, timeout, session_id, workdir=workdir)
+
+
+#----------------- Speculative Dispatch -----------------
+def _speculation_key(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    return f"{tool_name}:{json.dumps(tool_input, sort_keys=True)}"
+
+
+def start_speculative_run(tool_name: str, arguments: str):
+    """
+    Start a local_code_run call as soon as its arguments are complete,
+    while the rest of the response is still streaming. execute_tool()
+    picks the run up only if the final response makes the same call.
+    """
+    if tool_name != "local_code_run":
+        return
+    try:
+        tool_input = json.loads(arguments)
+        code = tool_input.get("code", "")
+        timeout = int(tool_input.get("timeout_sec", 15))
+    except (ValueError, TypeError, AttributeError):
+        return  # malformed call, the normal path reports it
+    if not code.strip() or _validate_user_code(code):
+        return  # preflight failed, the normal path reports it
+
+    runs = cl.user_session.get("speculative_runs") or {}
+    key = _speculation_key(tool_name, tool_input)
+    if key in runs:
+        return
+
+    session_id = cl.user_session.get("id")
+    workdir = prepare_sandbox(session_id)  # reserve the run dir up front
+    task = asyncio.create_task(_run_code(code, timeout, session_id, workdir=workdir))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # never leave an exception unretrieved
+    runs[key] = task
+    cl.user_session.set("speculative_runs", runs)
+    logger.info(f"Speculative code run started in {workdir.name}.")
+
+
+def _claim_speculative_run(tool_name: str, tool_input: Dict[str, Any]):
+    runs = cl.user_session.get("speculative_runs") or {}
+    return runs.pop(_speculation_key(tool_name, tool_input), None)
+
+
+def discard_unconfirmed_runs(output_items):
+    """
+    Cancel speculative runs whose call is not in the final response, as soon
+    as it is known, so they stop holding sandbox slots for the rest of the turn.
+    """
+    runs = cl.user_session.get("speculative_runs") or {}
+    confirmed = set()
+    for item in output_items or []:
+        if item.type not in ["tool_call", "function_call"]:
+            continue
+        try:
+            confirmed.add(_speculation_key(item.name, json.loads(item.arguments)))
+        except (ValueError, TypeError):
+            continue  # malformed call, the normal path reports it
+    for key in [k for k in runs if k not in confirmed]:
+        task = runs.pop(key)
+        if not task.done():
+            task.cancel()
+            logger.info("Discarded speculative code run: final response changed the call.")
+
+
+def discard_speculative_runs():
+    """Cancel all speculative runs still unclaimed at the end of the turn."""
+    runs = cl.user_session.get("speculative_runs") or {}
+    for task in runs.values():
+        if not task.done():
+            task.cancel()
+            logger.info("Discarded speculative code run: not claimed by the end of the turn.")
+    runs.clear()
+
+
+
 #----------------- Retry Code Execution -----------------
 async def handle_code_retry(client, tools, tool_results, history):
     """
-    Retry code execution up to MAX_CODE_RETRIES times if errors persist.
+    Retry code execution up to MAX_CODE_RETRIES times on the chosen model if
+    errors persist, after one attempt on each fast tier the router allows.
     Uses the same Responses API + tool_call loop each time.
     """
-    for attempt in range(1, MAX_CODE_RETRIES + 1):
+    chosen = cl.user_session.get("settings")["model"]
+    ladder = model_router.ladder("repair", chosen)  # one routing decision per repair loop
+    fast_attempts = len(ladder) - 1
+    for attempt in range(1, fast_attempts + MAX_CODE_RETRIES + 1):
 
         await cl.Message(
             content=f"⚙️ Attempt {attempt}: code execution failed — model will try to fix and re-run..."
@@ -88,30 +180,38 @@ async def handle_code_retry(client, tools, tool_results, history):
             ],
         }
 
-        # Request model to produce fixed code
+        # Request model to produce fixed code (fast tier first, chosen model after a failure)
+        model = model_router.pick("repair", chosen, ladder, attempt - 1)
+        started = time.monotonic()
         retry_response = await client.responses.create(
-            model=cl.user_session.get("settings")["model"],
+            model=model,
             input=history + [retry_instruction],
             # previous_response_id=cl.user_session.get("last_response_id", None),
             tools=tools,
             # truncate="auto",
             store=True,
         )
+        latency = time.monotonic() - started
 
         # Execute new tool call if present
         new_tool_results = []
-        if retry_response.output:
-            # cl.user_session.set("last_response_id", retry_response.id)
-            for retry_item in retry_response.output:
-                if retry_item.type in ["tool_call", "function_call"]:
-                    retry_tool_name = retry_item.name
-                    retry_tool_args = json.loads(retry_item.arguments)
-                    new_tool_results = await execute_tool(retry_tool_name, retry_tool_args)
-        elif retry_response.output_text:
-            return [ToolResult(type=ToolResultType.text, content=retry_response.output_text, error=True)]
+        retry_calls = [item for item in retry_response.output or [] if item.type in ["tool_call", "function_call"]]
+        if not retry_calls:
+            # Answered in text instead of fixing the code
+            model_router.record("repair", model, latency, False)
+            if model == chosen:
+                return [ToolResult(type=ToolResultType.text, content=retry_response.output_text, error=True)]
+            continue  # fast tier, escalate
+        # cl.user_session.set("last_response_id", retry_response.id)
+        for retry_item in retry_calls:
+            retry_tool_name = retry_item.name
+            retry_tool_args = json.loads(retry_item.arguments)
+            new_tool_results = await execute_tool(retry_tool_name, retry_tool_args)
 
         # if succeeded (no errors), stop looping
-        if new_tool_results and not any(r.error for r in new_tool_results):
+        succeeded = bool(new_tool_results) and not any(r.error for r in new_tool_results)
+        model_router.record("repair", model, latency, succeeded)
+        if succeeded:
             await cl.Message(
                 content=f"✅ Code fixed and executed successfully on attempt {attempt}."
             ).send()
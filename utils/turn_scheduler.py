@@ -0,0 +1,71 @@
+import asyncio
+
+from utils.logger_config import logger
+
+
+# ----------------- Turn Scheduler -----------------
+class TurnScheduler:
+    """
+    Per-session ordered turn queue.
+    Turns run one at a time so only one of them mutates the message history.
+    A newly submitted turn supersedes the in-flight one: the old turn is
+    cancelled (closing its LLM stream and killing its sandbox process) and
+    the new turn starts only after the old one has finished cleaning up.
+    A turn superseded while still queued never runs; its on_dropped()
+    callback is called instead, in its place in the queue.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._current: asyncio.Task | None = None
+        self._current_state: dict | None = None
+        self._seq = 0
+
+    async def _run(self, previous, turn_fn, seq, state, on_dropped):
+        if previous is not None:
+            # Let the superseded turn release its resources (or record its drop)
+            await asyncio.wait([previous])
+        async with self._lock:
+            if state["superseded"]:
+                # Queued turns are flagged rather than cancelled: a task cancelled
+                # before its first step would never reach this point
+                logger.info(f"[TURN] turn {seq} dropped before it started")
+                if on_dropped is not None:
+                    on_dropped()
+                return
+            state["started"] = True
+            logger.info(f"[TURN] turn {seq} started")
+            await turn_fn()
+            logger.info(f"[TURN] turn {seq} finished")
+
+    def _supersede(self, task, state):
+        if state["started"]:
+            task.cancel()
+        else:
+            state["superseded"] = True
+
+    async def submit(self, turn_fn, on_dropped=None):
+        """
+        Run turn_fn() as the session's next turn, cancelling any in-flight turn.
+        on_dropped() is called if this turn is superseded before it starts.
+        """
+        previous = self._current
+        if previous is not None and not previous.done():
+            logger.info(f"[TURN] turn {self._seq} superseded by a new message")
+            self._supersede(previous, self._current_state)
+
+        self._seq += 1
+        state = {"started": False, "superseded": False}
+        task = asyncio.create_task(self._run(previous, turn_fn, self._seq, state, on_dropped))
+        self._current, self._current_state = task, state
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                # The caller itself was cancelled (e.g. user pressed stop)
+                self._supersede(task, state)
+                raise
+            # Superseded by a newer turn; nothing left to do here
+        finally:
+            if self._current is task and task.done():
+                self._current = self._current_state = None